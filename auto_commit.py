@@ -1,57 +1,143 @@
 import os
 import subprocess
-from anthropic import Anthropic
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
 
-# Use the API key from the environment variable
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+# Use the API key from the environment variable, loading .env only if it is not set
+ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
+if ANTHROPIC_API_KEY is None:
+    from dotenv import load_dotenv
+    load_dotenv()
+    ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
 
-def is_git_repository():
-    try:
-        subprocess.run(['git', 'rev-parse', '--is-inside-work-tree'], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except subprocess.CalledProcessError:
-        return False
+# Upper bound on how much of the diff is sent to the API
+MAX_DIFF_BYTES = 200_000
 
 def get_git_changes():
+    # `git status` fails outside a work tree, so it doubles as the repository check
+    try:
+        result = subprocess.run(['git', 'status', '--porcelain', '-b'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except subprocess.CalledProcessError:
+        return None
+    # Drop the "## branch" header line that -b adds
+    changed_files = result.stdout.partition('\n')[2].strip()
+    if not changed_files:
+        return None, None
     try:
-        result = subprocess.run(['git', 'status', '--porcelain'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        changed_files = result.stdout.decode('utf-8').strip()
-        if not changed_files:
-            return None, None
-        result = subprocess.run(['git', 'diff'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        diff = result.stdout.decode('utf-8').strip()
+        # --patch-with-stat puts the summary first, so it survives the size cap
+        # Read only up to the cap and stop git instead of buffering the whole diff
+        with subprocess.Popen(['git', 'diff', '--no-color', '-U1', '--patch-with-stat'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+            output = process.stdout.read(MAX_DIFF_BYTES + 1)
+            truncated = len(output) > MAX_DIFF_BYTES
+            if truncated:
+                process.terminate()
+            returncode = process.wait()
+        if returncode and not truncated:
+            raise subprocess.CalledProcessError(returncode, process.args)
+        diff = output[:MAX_DIFF_BYTES].decode('utf-8', errors='replace').strip()
         return changed_files, diff
     except subprocess.CalledProcessError as e:
         print(f"Error getting git changes: {e}")
         return None, None
 
 def generate_commit_message(diff):
+    # Imported here so runs with nothing to commit never load the SDK
+    from anthropic import Anthropic
+
     client = Anthropic(api_key=ANTHROPIC_API_KEY)
     
+    prompt = f"Analyze the diff and create a commit message summarizing the changes. Start with a brief title (max 40 chars) as an overall summary. After a blank line, provide a detailed explanation in 2-3 sentences that captures the essence of the changes. Avoid introductory phrases or review requests.\n\n{diff}"
+
     try:
-        response = client.completions.create(
-            model="claude-1",
-            max_tokens_to_sample=2000,
-            prompt=f"\n\nHuman: Analyze the diff and create a commit message summarizing the changes. Start with a brief title (max 40 chars) as an overall summary. After a blank line, provide a detailed explanation in 2-3 sentences that captures the essence of the changes. Avoid introductory phrases or review requests.\n\n{diff}\n\nAssistant:"
-        )
-        commit_message = response.completion.strip()
+        message = ""
+        with client.messages.stream(
+            model="claude-3-5-haiku-latest",
+            max_tokens=300,
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            for text in stream.text_stream:
+                message += text
+                # Title, blank line, explanation: another blank line means the
+                # message is complete and anything after it is extra commentary
+                if message.strip().count("\n\n") >= 2:
+                    break
+        title, _, body = message.strip().partition("\n\n")
+        body = body.partition("\n\n")[0]
+        commit_message = f"{title}\n\n{body}" if body else title
         return commit_message
     except Exception as e:
         print(f"Error during API request: {e}")
         return "Update repository"
 
-def commit_changes(commit_message):
+# Hooks `git commit` runs that libgit2 would silently skip
+COMMIT_HOOKS = ('pre-commit', 'prepare-commit-msg', 'commit-msg', 'post-commit')
+
+def can_commit_with_pygit2(repo):
+    config = repo.config
+    if 'commit.gpgsign' in config and config.get_bool('commit.gpgsign'):
+        return False
+    if 'core.hooksPath' in config:
+        hooks_dir = os.path.join(repo.workdir, os.path.expanduser(config['core.hooksPath']))
+    else:
+        hooks_dir = os.path.join(repo.path, 'hooks')
+    for hook in COMMIT_HOOKS:
+        hook_path = os.path.join(hooks_dir, hook)
+        if os.path.isfile(hook_path) and os.access(hook_path, os.X_OK):
+            return False
+    return True
+
+def commit_with_pygit2(commit_message):
+    # Returns False when the `git` CLI should make the commit instead
+    if pygit2 is None:
+        return False
     try:
-        subprocess.run(['git', 'add', '.'], check=True)
+        repo = pygit2.Repository(pygit2.discover_repository(os.getcwd()))
+        if repo.is_bare or not can_commit_with_pygit2(repo):
+            return False
+        # Merges, cherry-picks, reverts and rebases need `git commit` to record
+        # extra parents and clean up their state files
+        if hasattr(pygit2, 'enums'):
+            state_none = pygit2.enums.RepositoryState.NONE
+        else:
+            state_none = pygit2.GIT_REPOSITORY_STATE_NONE
+        if repo.state() != state_none:
+            return False
+        # Stage the current directory's subtree, like `git add .`
+        subdir = os.path.relpath(os.path.realpath(os.getcwd()), os.path.realpath(repo.workdir))
+        index = repo.index
+        index.add_all([] if subdir == '.' else [subdir.replace(os.sep, '/')])
+        index.write()
+        tree = index.write_tree()
+        # Nothing staged under this directory: let `git commit` refuse it
+        # rather than creating an empty commit
+        if repo.head_is_unborn:
+            if len(index) == 0:
+                return False
+        elif tree == repo.head.peel().tree.id:
+            return False
         first_line, _, rest = commit_message.partition('\n')
-        commit_cmd = ['git', 'commit', '-m', first_line]
-        if rest:
-            commit_cmd.extend(['-m', rest.strip()])
-        subprocess.run(commit_cmd, check=True)
+        message = f"{first_line}\n\n{rest.strip()}\n" if rest.strip() else f"{first_line}\n"
+        signature = repo.default_signature
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        repo.create_commit('HEAD', signature, signature, message, tree, parents)
+        return True
+    except (KeyError, OSError, pygit2.GitError) as e:
+        print(f"pygit2 commit failed, falling back to git: {e}")
+        return False
+
+def commit_changes(commit_message):
+    try:
+        if not commit_with_pygit2(commit_message):
+            subprocess.run(['git', 'add', '.'], check=True)
+            first_line, _, rest = commit_message.partition('\n')
+            commit_cmd = ['git', 'commit', '-m', first_line]
+            if rest:
+                commit_cmd.extend(['-m', rest.strip()])
+            subprocess.run(commit_cmd, check=True)
+        # `git push` honours the branch's upstream, push.default and credential helpers
         subprocess.run(['git', 'push'], check=True)
         print("Changes committed and pushed successfully.")
         print("Commit message:", commit_message)
@@ -62,10 +148,11 @@ def main():
     if not ANTHROPIC_API_KEY:
         print("ANTHROPIC_API_KEY is not set in the environment variables.")
         return
-    if not is_git_repository():
+    changes = get_git_changes()
+    if changes is None:
         print("Current directory is not a Git repository.")
         return
-    changed_files, diff = get_git_changes()
+    changed_files, diff = changes
     if not diff:
         print("No changes detected.")
         return
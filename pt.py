@@ -1,163 +1,324 @@
 # Filename: pt.py
 
 import os
+import sys
 import argparse
 from datetime import datetime
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import yaml
+try:
+    from yaml import CSafeLoader
+except ImportError:
+    from yaml import SafeLoader as CSafeLoader
 import subprocess
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_tree(root_dir: str, exclude: set) -> str:
-    output = []
+# Keyed by the lowercased extension without its dot
+EXT_TO_BUCKET = {
+    'unity': 'Scenes',
+    'prefab': 'Prefabs',
+    'mat': 'Materials',
+    'png': 'Textures',
+    'jpg': 'Textures',
+    'jpeg': 'Textures',
+    'tga': 'Textures',
+    'cs': 'Scripts',
+}
+
+def loads_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_json(data):
+    # Indented JSON; YAML mappings may have non-string keys, which JSON
+    # output needs as strings
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder handles
+            pass
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+# Tree branch markers, pre-encoded for the byte buffer in collect_project
+BRANCH = "├── ".encode('utf-8')
+LAST_BRANCH = "└── ".encode('utf-8')
+
+# Names left out of the tree; anything starting with a dot (.git, .vs, ...)
+# is covered by EXCLUDE_PREFIX
+EXCLUDE_EXACT = frozenset({
+    "__pycache__", "node_modules",
+    "bin", "obj", "build", "dist", "target",
+    "Temp", "Library", "Logs", "UserSettings",  # Unity-specific
+})
+EXCLUDE_PREFIX = (".",)
+
+def collect_project(root_dir: str, exclude: frozenset, exclude_prefix: tuple, max_depth_under_assets=2):
+    tree = bytearray()
+    asset_counts = {
+        'Scenes': 0,
+        'Prefabs': 0,
+        'Materials': 0,
+        'Textures': 0,
+        'Scripts': 0
+    }
+    scene_paths = []
+    known_files = {}
     root_dir = os.path.abspath(root_dir)
+    scenes_rel = os.path.join('Assets', 'Scenes')
+    # Project folders read by the get_* helpers; these (and the files in
+    # them) are followed when they are symlinks, like os.path.exists did.
+    # File symlinks anywhere under Assets/ are followed too, so they are
+    # counted like os.walk counted them
+    project_dirs = frozenset({'Assets', 'ProjectSettings', 'Packages', scenes_rel})
+    # Local bindings for the per-entry loop below
+    join = os.path.join
+    fsencode = os.fsencode
+    bucket_for = EXT_TO_BUCKET.get
 
     def should_include(name):
-        return not any(name.startswith(ex) for ex in exclude)
+        return name not in exclude and not name.startswith(exclude_prefix)
 
-    def add_directory(path, prefix=""):
-        dir_name = os.path.basename(path)
-        if not should_include(dir_name):
-            return
+    # Walk the project once: directories hidden from the tree are still
+    # visited under Assets/ so the asset counts cover them. `depth` is the
+    # level below Assets/ (None outside it); directories deeper than
+    # max_depth_under_assets are listed as a file count instead of expanded.
+    # `listed` marks directories that would be in the tree without that
+    # cap. Returns how many listed files the directory holds.
+    def add_directory(path, dir_name, rel, prefix, emit, listed, depth):
+        nonlocal tree
+        in_assets = depth is not None
+        expand = emit and not (in_assets and max_depth_under_assets is not None and depth > max_depth_under_assets)
+        if emit:
+            tree += prefix
+            tree += fsencode(dir_name)
+            tree += b"/\n"
 
-        output.append(f"{prefix}{dir_name}/")
-        
         try:
-            items = sorted(os.listdir(path))
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
         except PermissionError:
-            output.append(f"{prefix}├── <Permission Denied>")
-            return
+            if emit:
+                tree += prefix
+                tree += BRANCH
+                tree += b"<Permission Denied>\n"
+            return 0
+        except OSError:
+            return 0
 
-        dirs = [item for item in items if os.path.isdir(os.path.join(path, item)) and should_include(item)]
-        files = [item for item in items if os.path.isfile(os.path.join(path, item)) and should_include(item)]
+        listed_files = 0
+        dirs = []
+        hidden_dirs = []
+        files = []
+        for entry in entries:
+            name = entry.name
+            child_rel = join(rel, name) if rel else name
+            included = name not in exclude and not name.startswith(exclude_prefix)
+            if entry.is_dir(follow_symlinks=child_rel in project_dirs):
+                child_depth = depth + 1 if in_assets else (0 if child_rel == 'Assets' else None)
+                if expand and included:
+                    dirs.append((entry, child_rel, child_depth))
+                elif child_depth is not None or child_rel in ('ProjectSettings', 'Packages'):
+                    hidden_dirs.append((entry, child_rel, child_depth, listed and included))
+            elif entry.is_file(follow_symlinks=in_assets or rel in project_dirs):
+                if in_assets:
+                    _, dot, ext = name.rpartition('.')
+                    if dot:
+                        bucket = bucket_for(ext.lower())
+                        if bucket is not None:
+                            asset_counts[bucket] += 1
+                    if rel == scenes_rel and name.endswith('.unity'):
+                        scene_paths.append(entry.path)
+                elif rel in ('ProjectSettings', 'Packages'):
+                    known_files[child_rel] = entry.path
+                if listed and included:
+                    listed_files += 1
+                    if expand:
+                        files.append(entry)
 
-        for i, dir_name in enumerate(dirs):
+        for i, (entry, child_rel, child_depth) in enumerate(dirs):
             is_last = (i == len(dirs) - 1 and len(files) == 0)
-            new_prefix = prefix + ("└── " if is_last else "├── ")
-            next_prefix = prefix + ("    " if is_last else "│   ")
-            add_directory(os.path.join(path, dir_name), new_prefix)
-        
-        for i, file_name in enumerate(files):
+            new_prefix = prefix + (LAST_BRANCH if is_last else BRANCH)
+            listed_files += add_directory(entry.path, entry.name, child_rel, new_prefix, True, True, child_depth)
+
+        for entry, child_rel, child_depth, child_listed in hidden_dirs:
+            listed_files += add_directory(entry.path, entry.name, child_rel, prefix, False, child_listed, child_depth)
+
+        for i, entry in enumerate(files):
             is_last = (i == len(files) - 1)
-            output.append(f"{prefix}{'└── ' if is_last else '├── '}{file_name}")
+            tree += prefix
+            tree += LAST_BRANCH if is_last else BRANCH
+            tree += fsencode(entry.name)
+            tree += b"\n"
+
+        if emit and not expand:
+            tree += prefix
+            tree += LAST_BRANCH
+            tree += f"<{listed_files} files> (truncated)\n".encode('utf-8')
+        return listed_files
+
+    root_name = os.path.basename(root_dir)
+    root_included = should_include(root_name)
+    add_directory(root_dir, root_name, '', b"", root_included, root_included, None)
+    del tree[-1:]  # no newline after the last line
+    return tree.decode('utf-8', errors='replace'), asset_counts, scene_paths, known_files
+
+MAX_ASSET_READ = 65536
+# Bump whenever parse_asset_file's output changes so old previews are dropped
+CACHE_FORMAT_VERSION = 1
+
+def get_cache_dir(project_path):
+    # Unity's Library/ is the project's own gitignored cache; outside a Unity
+    # project fall back to a private per-user directory
+    library = os.path.join(project_path, 'Library')
+    if os.path.isdir(library):
+        cache_dir = os.path.join(library, 'pt_cache')
+    else:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'pt')
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    except OSError:
+        return None
+    return cache_dir
+
+def _cache_path(cache_dir, file_path):
+    digest = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+def read_asset_file(file_path, cache_dir=None):
+    if cache_dir is None:
+        return parse_asset_file(file_path)
 
-    add_directory(root_dir)
-    return "\n".join(output)
+    # Reuse the preview from a previous run only if the asset is unchanged
+    cache_path = _cache_path(cache_dir, file_path)
+    try:
+        st = os.stat(file_path)
+        key = [st.st_size, st.st_mtime_ns, CACHE_FORMAT_VERSION]
+    except OSError:
+        return parse_asset_file(file_path)
+    try:
+        with open(cache_path, 'rb') as cache:
+            entry = loads_json(cache.read())
+        if entry['key'] == key:
+            return entry['preview']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    preview = parse_asset_file(file_path)
+    # Write to a fresh temp file and rename it into place, so an interrupted
+    # run never leaves a truncated entry behind
+    try:
+        tmp = tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False)
+    except OSError:
+        return preview
+    try:
+        with tmp:
+            tmp.write(json.dumps({'key': key, 'preview': preview}).encode('utf-8'))
+        os.replace(tmp.name, cache_path)
+    except OSError:
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
+    return preview
 
-def read_asset_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-        # Try parsing as YAML first
+def parse_asset_file(file_path):
+    # Only a preview is kept, so only read and parse the start of the file.
+    # Reading raw bytes keeps this a single bounded read however large the
+    # scene is, and binary-serialized assets decode with replacement
+    # characters instead of raising
+    with open(file_path, 'rb') as file:
+        content = file.read(MAX_ASSET_READ).decode('utf-8', errors='replace')
+    # Pick the parser from the first non-whitespace character instead of
+    # trying YAML on everything; if it fails, return the raw content
+    if content.lstrip()[:1] in ('{', '['):
         try:
-            data = yaml.safe_load(content)
-            return json.dumps(data, indent=2)[:1000]  # Return first 1000 characters as JSON
-        except yaml.YAMLError:
-            # If YAML parsing fails, try JSON
-            try:
-                data = json.loads(content)
-                return json.dumps(data, indent=2)[:1000]  # Return first 1000 characters
-            except json.JSONDecodeError:
-                # If both fail, return a portion of the raw content
-                return content[:1000]  # Return first 1000 characters of raw content
-
-def get_build_settings(project_path):
-    build_settings_path = os.path.join(project_path, 'ProjectSettings', 'EditorBuildSettings.asset')
-    if os.path.exists(build_settings_path):
-        return read_asset_file(build_settings_path)
+            data = loads_json(content)
+            return dumps_json(data)[:1000]  # Return first 1000 characters as JSON
+        except (ValueError, TypeError):
+            return content[:1000]  # Return first 1000 characters of raw content
+    try:
+        data = yaml.load(content, Loader=CSafeLoader)
+        return dumps_json(data)[:1000]  # Return first 1000 characters as JSON
+    except (yaml.YAMLError, ValueError, TypeError):
+        # Also covers a prefix that cut a document short, and YAML values
+        # that have no JSON form
+        return content[:1000]  # Return first 1000 characters of raw content
+
+def get_build_settings(known_files, cache_dir=None):
+    build_settings_path = known_files.get(os.path.join('ProjectSettings', 'EditorBuildSettings.asset'))
+    if build_settings_path:
+        return read_asset_file(build_settings_path, cache_dir)
     return "Build settings file not found"
 
-def get_package_versions(project_path):
-    packages_lock_path = os.path.join(project_path, 'Packages', 'packages-lock.json')
-    if os.path.exists(packages_lock_path):
-        with open(packages_lock_path, 'r') as file:
-            data = json.load(file)
-            return json.dumps(data, indent=2)
+def get_package_versions(known_files):
+    packages_lock_path = known_files.get(os.path.join('Packages', 'packages-lock.json'))
+    if packages_lock_path:
+        with open(packages_lock_path, 'rb') as file:
+            data = loads_json(file.read())
+            return dumps_json(data)
     return "Package lock file not found"
 
-def get_project_settings(project_path):
-    project_settings_path = os.path.join(project_path, 'ProjectSettings', 'ProjectSettings.asset')
-    if os.path.exists(project_settings_path):
-        return read_asset_file(project_settings_path)
+def get_project_settings(known_files, cache_dir=None):
+    project_settings_path = known_files.get(os.path.join('ProjectSettings', 'ProjectSettings.asset'))
+    if project_settings_path:
+        return read_asset_file(project_settings_path, cache_dir)
     return "Project settings file not found"
 
-def get_quality_settings(project_path):
-    quality_settings_path = os.path.join(project_path, 'ProjectSettings', 'QualitySettings.asset')
-    if os.path.exists(quality_settings_path):
-        return read_asset_file(quality_settings_path)
+def get_quality_settings(known_files, cache_dir=None):
+    quality_settings_path = known_files.get(os.path.join('ProjectSettings', 'QualitySettings.asset'))
+    if quality_settings_path:
+        return read_asset_file(quality_settings_path, cache_dir)
     return "Quality settings file not found"
 
-def get_scene_hierarchies(project_path):
-    scenes_path = os.path.join(project_path, 'Assets', 'Scenes')
-    hierarchies = {}
-    if os.path.exists(scenes_path):
-        for scene_file in os.listdir(scenes_path):
-            if scene_file.endswith('.unity'):
-                scene_path = os.path.join(scenes_path, scene_file)
-                hierarchies[scene_file] = read_asset_file(scene_path)
-    return hierarchies
-
-def get_unity_version(project_path):
-    version_file = os.path.join(project_path, 'ProjectSettings', 'ProjectVersion.txt')
-    if os.path.exists(version_file):
+def get_scene_hierarchies(scene_paths, cache_dir=None):
+    # Scenes are independent, so overlap their reads and parses
+    names = [os.path.basename(scene_path) for scene_path in scene_paths]
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        return dict(zip(names, executor.map(read_asset_file, scene_paths, [cache_dir] * len(scene_paths))))
+
+def get_unity_version(known_files):
+    version_file = known_files.get(os.path.join('ProjectSettings', 'ProjectVersion.txt'))
+    if version_file:
         with open(version_file, 'r') as file:
             return file.read().strip()
     return "Unity version information not found"
 
 def get_git_info(project_path):
     try:
-        branch = subprocess.check_output(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=project_path).decode().strip()
-        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=project_path).decode().strip()
+        # One rev-parse call: the full hash first, then the branch name
+        commit, branch = subprocess.check_output(['git', 'rev-parse', 'HEAD', '--abbrev-ref', 'HEAD'], cwd=project_path, text=True).split()
         return f"Branch: {branch}\nLast commit: {commit}"
     except subprocess.CalledProcessError:
         return "Git information not available"
 
-def count_assets(project_path):
-    asset_counts = {
-        'Scenes': 0,
-        'Prefabs': 0,
-        'Materials': 0,
-        'Textures': 0,
-        'Scripts': 0
-    }
-
-    for root, dirs, files in os.walk(os.path.join(project_path, 'Assets')):
-        for file in files:
-            if file.endswith('.unity'):
-                asset_counts['Scenes'] += 1
-            elif file.endswith('.prefab'):
-                asset_counts['Prefabs'] += 1
-            elif file.endswith('.mat'):
-                asset_counts['Materials'] += 1
-            elif file.endswith(('.png', '.jpg', '.jpeg', '.tga')):
-                asset_counts['Textures'] += 1
-            elif file.endswith('.cs'):
-                asset_counts['Scripts'] += 1
-
-    return asset_counts
-
 def main():
     parser = argparse.ArgumentParser(description="Generate an enhanced tree-like structure of the Unity project directory.")
     parser.add_argument("--root-dir", default=".", help="The root directory to start from (default: current directory)")
+    parser.add_argument("--max-asset-depth", type=int, default=2, help="How many levels below Assets/ to expand in the tree (default: 2)")
     
     args = parser.parse_args()
     
     if args.root_dir == ".":
         args.root_dir = os.path.dirname(os.path.abspath(__file__))
 
-    exclude = {
-        ".", "..", ".git", ".vs", ".vscode", "__pycache__", "node_modules",
-        "bin", "obj", "build", "dist", "target",
-        "Temp", "Library", "Logs", "UserSettings",  # Unity-specific
-    }
-    
-    tree = generate_tree(args.root_dir, exclude)
-    build_settings = get_build_settings(args.root_dir)
-    package_versions = get_package_versions(args.root_dir)
-    project_settings = get_project_settings(args.root_dir)
-    quality_settings = get_quality_settings(args.root_dir)
-    scene_hierarchies = get_scene_hierarchies(args.root_dir)
-    unity_version = get_unity_version(args.root_dir)
+    # Single pass over the project, then read the files it found
+    tree, asset_counts, scene_paths, known_files = collect_project(args.root_dir, EXCLUDE_EXACT, EXCLUDE_PREFIX, args.max_asset_depth)
+    cache_dir = get_cache_dir(args.root_dir)
+    build_settings = get_build_settings(known_files, cache_dir)
+    package_versions = get_package_versions(known_files)
+    project_settings = get_project_settings(known_files, cache_dir)
+    quality_settings = get_quality_settings(known_files, cache_dir)
+    scene_hierarchies = get_scene_hierarchies(scene_paths, cache_dir)
+    unity_version = get_unity_version(known_files)
     git_info = get_git_info(args.root_dir)
-    asset_counts = count_assets(args.root_dir)
     
     output = f"""
 Project Tree:
@@ -176,7 +337,7 @@ Quality Settings:
 {quality_settings}
 
 Scene Hierarchies:
-{json.dumps(scene_hierarchies, indent=2)}
+{dumps_json(scene_hierarchies)}
 
 Unity Version:
 {unity_version}
@@ -185,18 +346,32 @@ Git Information:
 {git_info}
 
 Asset Counts:
-{json.dumps(asset_counts, indent=2)}
+{dumps_json(asset_counts)}
     """
     
     # Generate a filename with a timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"project_structure_{timestamp}.txt"
     
+    # Encode once and reuse the bytes for both the file and stdout
+    data = output.encode('utf-8')
+
     # Save the output to a file in the current working directory
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(output)
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
     
-    print(output)
+    # Replaced streams (IDE consoles, StringIO captures) may have no binary buffer
+    stdout_buffer = getattr(sys.stdout, 'buffer', None)
+    if stdout_buffer is not None:
+        stdout_buffer.write(data)
+        stdout_buffer.write(b"\n")
+    else:
+        print(output)
     print(f"\nEnhanced project structure and additional info saved to {filename}")
 
 if __name__ == "__main__":